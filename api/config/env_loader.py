@@ -32,6 +32,14 @@ def get_groq_api_key():
         raise Exception("GROQ_API_KEY environment variable not set")
     return api_key
 
+def get_max_history_turns():
+    """Get how many past conversation turns to replay in prompts"""
+    try:
+        return int(os.getenv('MAX_HISTORY_TURNS', '10'))
+    except ValueError:
+        print("⚠️ Invalid MAX_HISTORY_TURNS value. Defaulting to 10")
+        return 10
+
 def get_selected_model():
     """Get the selected AI model from environment variable"""
     model = os.getenv('MODEL', 'GEMINI').upper()
@@ -20,8 +20,22 @@ class APIHandler(BaseHTTPRequestHandler):
                 # Handle query parameter
                 if 'query' in query_params:
                     query = urllib.parse.unquote(query_params['query'])
+
+                    if query_params.get('stream') == '1':
+                        # Stream chunks as the model produces them
+                        self.send_response(200)
+                        self.send_header('Content-type', 'text/plain; charset=utf-8')
+                        self.send_header('Access-Control-Allow-Origin', '*')
+                        self.send_header('Cache-Control', 'no-cache')
+                        self.send_header('X-Accel-Buffering', 'no')
+                        self.end_headers()
+                        for chunk in gopal_service.handle_query_stream(query):
+                            self.wfile.write(chunk.encode('utf-8'))
+                            self.wfile.flush()
+                        return
+
                     response_text = gopal_service.handle_query(query)
-                    
+
                     self.send_response(200)
                     self.send_header('Content-type', 'text/plain; charset=utf-8')
                     self.send_header('Access-Control-Allow-Origin', '*')
@@ -1,3 +1,12 @@
+import os
+
+# Let BLAS use every core for the similarity matmul. These must be set
+# before NumPy first loads its BLAS backend, so they go ahead of any
+# import that pulls in the services.
+_cpu_count = str(os.cpu_count() or 1)
+os.environ.setdefault('OMP_NUM_THREADS', _cpu_count)
+os.environ.setdefault('OPENBLAS_NUM_THREADS', _cpu_count)
+
 from api.config.env_loader import load_env_file
 from api.handlers.api_handler import APIHandler
 
@@ -6,3 +15,17 @@ load_env_file()
 
 # Global instance for Vercel
 handler = APIHandler
+
+if __name__ == '__main__':
+    # Local dev server. ThreadingHTTPServer handles each request on its
+    # own thread; the matmul inside search releases the GIL in BLAS, so
+    # concurrent queries scale across cores instead of queueing.
+    from http.server import ThreadingHTTPServer
+
+    port = int(os.environ.get('PORT', 8000))
+    server = ThreadingHTTPServer(('0.0.0.0', port), APIHandler)
+    print(f"🚀 Serving on http://localhost:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
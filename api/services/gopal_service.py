@@ -1,21 +1,86 @@
+import hashlib
 import json
+import logging
+import os
+import time
 from api.utils.embedding_utils import EmbeddingManager
 from api.utils.search_utils import SearchUtils
 from api.utils.api_utils import GeminiAPI
+from api.utils.json_cache import load_json_cached
+
+# How long cached LLM responses stay valid (seconds)
+RESPONSE_CACHE_TTL = 86400
+
+# Providers signal failure in-band by returning this phrase (see the
+# generate_response_with_context error paths); such responses must never
+# be cached or one transient failure would be replayed for the whole TTL
+_ERROR_MARKER = "Sorry, I encountered an error"
+
+# Per-query diagnostics are debug-level so the hot path skips stdout I/O
+logger = logging.getLogger(__name__)
 
 class GopalService:
     def __init__(self):
         self.profile_data = self.load_profile_data()
+        # Lowercased and tokenized once here so the keyword fallback doesn't
+        # re-case-fold or re-tokenize every chunk on every request
+        self.profile_data_lower = [chunk.lower() for chunk in self.profile_data]
+        self.profile_data_tokens = SearchUtils.tokenize_chunks(self.profile_data_lower)
         self.embedding_manager = EmbeddingManager()
         self.embedding_manager.load_or_create_embeddings(self.profile_data)
+        # Semantic keyword mappings are a pure function of the profile, so
+        # walk the profile JSON once here instead of on every fallback search
+        try:
+            self.dynamic_mappings = SearchUtils._build_dynamic_mappings(
+                load_json_cached('data/myprofile.json'))
+        except Exception as e:
+            print(f"Error building semantic mappings: {e}")
+            self.dynamic_mappings = {}
+        self.response_cache_file = 'cache/response_cache.json'
+        self.response_cache = self._load_response_cache()
     
+    def _load_response_cache(self):
+        """Load cached LLM responses, dropping them if the profile has changed"""
+        try:
+            if os.path.exists(self.response_cache_file):
+                with open(self.response_cache_file, 'r', encoding='utf-8') as f:
+                    cache = json.load(f)
+                profile_hash = self.embedding_manager._load_profile_metadata().get('last_hash')
+                if cache.get('profile_hash') == profile_hash:
+                    return cache
+                print("🔄 Profile changed, invalidating response cache")
+        except Exception as e:
+            print(f"Error loading response cache: {e}")
+        return {'profile_hash': self.embedding_manager._load_profile_metadata().get('last_hash'),
+                'responses': {}}
+
+    def _save_response_cache(self):
+        """Save the response cache to disk, dropping expired entries"""
+        try:
+            # TTL is otherwise only checked on read, so without this sweep
+            # dead entries would accumulate and bloat every rewrite
+            now = time.time()
+            responses = self.response_cache['responses']
+            for key in [k for k, v in responses.items()
+                        if now - v['timestamp'] >= RESPONSE_CACHE_TTL]:
+                del responses[key]
+            os.makedirs(os.path.dirname(self.response_cache_file), exist_ok=True)
+            with open(self.response_cache_file, 'w', encoding='utf-8') as f:
+                json.dump(self.response_cache, f, indent=2)
+        except Exception as e:
+            print(f"Error saving response cache: {e}")
+
+    def _response_cache_key(self, query, relevant_context):
+        """Build a cache key from the query and its retrieved context"""
+        key_material = query + '||' + '||'.join(sorted(relevant_context))
+        return hashlib.md5(key_material.encode()).hexdigest()
+
     def load_profile_data(self):
         """Load profile data from JSON file"""
         try:
-            with open('data/myprofile.json', 'r', encoding='utf-8') as f:
-                profile = json.load(f)
-                # Convert profile data into searchable text chunks
-                return self.convert_profile_to_chunks(profile)
+            profile = load_json_cached('data/myprofile.json')
+            # Convert profile data into searchable text chunks
+            return self.convert_profile_to_chunks(profile)
         except Exception as e:
             print(f"Error loading profile data: {e}")
             return []
@@ -102,48 +167,126 @@ class GopalService:
         
         return chunks
     
-    def handle_query(self, query):
+    def _retrieve_context(self, query):
+        """Find relevant context for a query, falling back to keyword search"""
+        matrix, contents = self.embedding_manager.get_embedding_matrix()
+        logger.debug("📊 Embeddings cache size: %d", len(contents))
+
+        # Try embedding search first
+        try:
+            relevant_context = SearchUtils.find_relevant_context(
+                query,
+                matrix,
+                contents,
+                self.embedding_manager.get_cached_embedding,
+                top_k=3,
+                matrix_i8=self.embedding_manager.get_embedding_matrix_i8()
+            )
+            logger.debug("🔍 Embedding search result: %d contexts",
+                         len(relevant_context) if relevant_context else 0)
+        except Exception as e:
+            print(f"⚠️ Embedding search failed: {e}")
+            relevant_context = None
+
+        # Fallback to simple search if embedding search fails
+        if relevant_context is None or len(relevant_context) == 0:
+            logger.debug("🔄 Falling back to simple keyword search...")
+            relevant_context = SearchUtils.find_relevant_context_simple(
+                query,
+                self.profile_data,
+                top_k=3,
+                profile_data_lower=self.profile_data_lower,
+                dynamic_mappings=self.dynamic_mappings,
+                profile_data_tokens=self.profile_data_tokens
+            )
+            logger.debug("🔍 Simple search found: %d contexts",
+                         len(relevant_context) if relevant_context else 0)
+
+        return relevant_context
+
+    def handle_query(self, query, nocache=False):
         """Main function to handle user queries"""
         try:
-            print(f"🔍 Processing query: {query}")
-            
-            # Find relevant context using embeddings
-            embeddings_cache = self.embedding_manager.get_embeddings_cache()
-            print(f"📊 Embeddings cache size: {len(embeddings_cache)}")
-            
-            # Try embedding search first
-            try:
-                relevant_context = SearchUtils.find_relevant_context(
-                    query, 
-                    embeddings_cache, 
-                    self.embedding_manager.get_cached_embedding,
-                    top_k=3
-                )
-                print(f"🔍 Embedding search result: {len(relevant_context) if relevant_context else 0} contexts")
-            except Exception as e:
-                print(f"⚠️ Embedding search failed: {e}")
-                relevant_context = None
-            
-            # Fallback to simple search if embedding search fails
-            if relevant_context is None or len(relevant_context) == 0:
-                print("🔄 Falling back to simple keyword search...")
-                relevant_context = SearchUtils.find_relevant_context_simple(
-                    query, 
-                    self.profile_data, 
-                    top_k=3
-                )
-                print(f"🔍 Simple search found: {len(relevant_context) if relevant_context else 0} contexts")
-            
+            logger.debug("🔍 Processing query: %s", query)
+
+            relevant_context = self._retrieve_context(query)
+
             if not relevant_context:
-                print("❌ No relevant context found in either search method")
+                logger.debug("❌ No relevant context found in either search method")
                 return "I don't have enough information to answer that question. Please try asking something else."
-            
-            print(f"📚 Found {len(relevant_context)} relevant contexts")
-            
+
+            logger.debug("📚 Found %d relevant contexts", len(relevant_context))
+
+            # Same question + same retrieved context means the same answer —
+            # serve it from the cache instead of paying for an LLM round-trip
+            cache_key = self._response_cache_key(query, relevant_context)
+            if not nocache:
+                cached = self.response_cache['responses'].get(cache_key)
+                if cached and time.time() - cached['timestamp'] < RESPONSE_CACHE_TTL:
+                    logger.debug("⚡ Response cache hit, skipping LLM call")
+                    return cached['response']
+
             # Generate response using Gemini API
             response = GeminiAPI.generate_response_with_context(query, relevant_context)
+
+            # Only cache real answers — provider error messages would
+            # otherwise be replayed for 24 hours instead of retried
+            if _ERROR_MARKER not in response:
+                self.response_cache['responses'][cache_key] = {
+                    'response': response,
+                    'timestamp': time.time()
+                }
+                self._save_response_cache()
+
             return response
             
         except Exception as e:
             print(f"Error handling query: {e}")
             return f"Sorry, I encountered an error: {str(e)}"
+
+    def handle_query_stream(self, query, nocache=False):
+        """Handle a user query, yielding response chunks as they arrive
+
+        Streaming drops time-to-first-byte from the full generation time to
+        roughly the first-chunk latency. Cache hits yield the stored answer
+        immediately; cache misses stream from the provider while accumulating
+        the full text so it can be cached for next time.
+        """
+        try:
+            logger.debug("🔍 Processing query (streaming): %s", query)
+
+            relevant_context = self._retrieve_context(query)
+
+            if not relevant_context:
+                logger.debug("❌ No relevant context found in either search method")
+                yield "I don't have enough information to answer that question. Please try asking something else."
+                return
+
+            logger.debug("📚 Found %d relevant contexts", len(relevant_context))
+
+            cache_key = self._response_cache_key(query, relevant_context)
+            if not nocache:
+                cached = self.response_cache['responses'].get(cache_key)
+                if cached and time.time() - cached['timestamp'] < RESPONSE_CACHE_TTL:
+                    logger.debug("⚡ Response cache hit, skipping LLM call")
+                    yield cached['response']
+                    return
+
+            chunks = []
+            for chunk in GeminiAPI.stream_response_with_context(query, relevant_context):
+                chunks.append(chunk)
+                yield chunk
+
+            full_response = ''.join(chunks)
+            # A stream can fail mid-way, leaving the error message appended
+            # to partial output — never cache anything from the error path
+            if _ERROR_MARKER not in full_response:
+                self.response_cache['responses'][cache_key] = {
+                    'response': full_response,
+                    'timestamp': time.time()
+                }
+                self._save_response_cache()
+
+        except Exception as e:
+            print(f"Error handling query: {e}")
+            yield f"Sorry, I encountered an error: {str(e)}"
@@ -7,30 +7,47 @@ from api.utils.perplexity_api import PerplexityAPI
 from api.utils.groq_api import GroqAPI
 from api.config.env_loader import get_selected_model
 
+# One provider instance per model, reused across requests so per-instance
+# caches (profile summary, conversation history) survive between queries
+_provider_cache = {}
+
+def _get_provider(model):
+    """Get (or lazily create) the shared provider instance for a model"""
+    provider = _provider_cache.get(model)
+    if provider is None:
+        if model == 'GEMINI':
+            provider = GoogleGeminiAPI()
+        elif model == 'PERPLEXITY':
+            provider = PerplexityAPI()
+        else:  # GROQ
+            provider = GroqAPI()
+        _provider_cache[model] = provider
+    return provider
+
 class GeminiAPI:
     """Generic AI API interface - supports Google Gemini, Perplexity, and Groq"""
-    
+
     def __init__(self):
         self.model = get_selected_model()
-        if self.model == 'GEMINI':
-            self.ai_provider = GoogleGeminiAPI()
-        elif self.model == 'PERPLEXITY':
-            self.ai_provider = PerplexityAPI()
-        else:  # GROQ
-            self.ai_provider = GroqAPI()
-        
+        self.ai_provider = _get_provider(self.model)
         print(f"🤖 Using AI Model: {self.model}")
-    
+
     @staticmethod
     def generate_response_with_context(query, relevant_context):
         """Generate response using the configured AI provider"""
-        model = get_selected_model()
-        
-        if model == 'GEMINI':
-            ai_provider = GoogleGeminiAPI()
-        elif model == 'PERPLEXITY':
-            ai_provider = PerplexityAPI()
-        else:  # GROQ
-            ai_provider = GroqAPI()
-        
+        ai_provider = _get_provider(get_selected_model())
         return ai_provider.generate_response_with_context(query, relevant_context)
+
+    @staticmethod
+    def stream_response_with_context(query, relevant_context):
+        """Stream response chunks from the configured AI provider
+
+        Falls back to yielding the full blocking response for providers that
+        don't support streaming yet.
+        """
+        ai_provider = _get_provider(get_selected_model())
+        stream_fn = getattr(ai_provider, 'stream_response_with_context', None)
+        if stream_fn is not None:
+            yield from stream_fn(query, relevant_context)
+        else:
+            yield ai_provider.generate_response_with_context(query, relevant_context)
@@ -1,17 +1,58 @@
 import hashlib
 import pickle
+import pickletools
 import os
 import time
 import json
+import numpy as np
 from api.utils.google_api import GoogleGeminiAPI
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # Fall back to uncompressed pickle if zstd isn't installed
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None  # Fall back to pickle for the sidecar index if msgpack isn't installed
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None  # Fall back to md5 for cache keys if xxhash isn't installed
+
+def _text_hash(text):
+    """Fast non-cryptographic hash used for cache keys"""
+    if xxhash is not None:
+        # python-xxhash 4.x rejects str input, so encode explicitly
+        return xxhash.xxh3_64_hexdigest(text.encode())
+    return hashlib.md5(text.encode()).hexdigest()
+
 class EmbeddingManager:
     def __init__(self, embeddings_file='cache/profile_embeddings.pkl'):
         self.embeddings_file = embeddings_file
-        self.embeddings_cache = {}
-        self.user_query_cache = {}
+        self.query_cache_file = 'cache/query_embeddings.pkl'
+        self.user_query_cache = self._load_query_cache()
         self.google_api = GoogleGeminiAPI()
         self.profile_metadata_file = 'cache/profile_metadata.json'
+        # Primary on-disk format: .npy matrix (self-describing shape/dtype,
+        # loadable with mmap_mode='r') + sidecar index. The raw .f32 file
+        # and the old .pkl file are still read as legacy fallbacks.
+        self.matrix_file = os.path.splitext(embeddings_file)[0] + '.npy'
+        self.legacy_matrix_file = os.path.splitext(embeddings_file)[0] + '.f32'
+        self.index_file = os.path.splitext(embeddings_file)[0] + '.idx'
+        # Structure-of-arrays store: the matrix slab (doubling growth, so
+        # appends are amortized O(1)) plus parallel lists indexed by row and
+        # a text -> row lookup. No per-entry dicts on the scoring path.
+        self._matrix = None
+        self._size = 0
+        self._contents = []
+        self._texts = []
+        self._source_fields = []
+        self._text_to_idx = {}
+        # Lazily built int8 view of the matrix for the SIMD scoring path
+        self._matrix_i8 = None
     
     def _get_profile_hash(self, profile_data):
         """Generate a hash of the profile data to detect changes"""
@@ -150,19 +191,17 @@ class EmbeddingManager:
             # Detect new fields first
             new_fields = self._detect_new_fields(profile_data)
             
-            if os.path.exists(self.embeddings_file) and not new_fields:
+            if self._cache_files_exist() and not new_fields:
                 print("🔄 Loading existing profile embeddings...")
-                with open(self.embeddings_file, 'rb') as f:
-                    self.embeddings_cache = pickle.load(f)
-                print(f"✅ Loaded {len(self.embeddings_cache)} profile embeddings from cache")
+                self._load_cache_from_disk()
+                print(f"✅ Loaded {self._size} profile embeddings from cache")
             else:
                 if new_fields:
                     print(f"🆕 New fields detected, updating embeddings...")
                     # Load existing embeddings if available
-                    if os.path.exists(self.embeddings_file):
-                        with open(self.embeddings_file, 'rb') as f:
-                            self.embeddings_cache = pickle.load(f)
-                        print(f"📚 Loaded {len(self.embeddings_cache)} existing embeddings")
+                    if self._cache_files_exist():
+                        self._load_cache_from_disk()
+                        print(f"📚 Loaded {self._size} existing embeddings")
                     
                     # Create embeddings for new fields only
                     self._update_embeddings_for_new_fields(profile_data, new_fields)
@@ -193,96 +232,296 @@ class EmbeddingManager:
             else:
                 flat_chunks.append(chunk)
         
-        # Create embeddings for new chunks
-        for i, chunk in enumerate(flat_chunks):
-            try:
-                chunk_embedding = self.get_embedding(chunk)
-                if chunk_embedding is not None:
-                    self.embeddings_cache[chunk] = {
-                        'embedding': chunk_embedding,
-                        'content': chunk,
-                        'source_field': 'new_field'
-                    }
-                    print(f"   📈 Created embedding for new chunk {i+1}/{len(flat_chunks)}")
-                
-                # Rate limiting
-                time.sleep(0.1)
-                
-            except Exception as e:
-                print(f"Error processing new chunk {i}: {e}")
-                continue
-        
+        # Create embeddings for new chunks in one batched call
+        embeddings = self.google_api.get_embeddings_batch(flat_chunks)
+
+        for chunk, chunk_embedding in zip(flat_chunks, embeddings):
+            if chunk_embedding is not None:
+                self._append_entry(chunk, chunk_embedding, chunk, 'new_field')
+
         print(f"🎉 Successfully updated embeddings for {len(flat_chunks)} new chunks!")
     
     def create_all_embeddings(self, profile_data):
-        """Create embeddings for all profile data chunks"""
+        """Create embeddings for all profile data chunks in batched API calls"""
         total_chunks = len(profile_data)
         print(f"📊 Processing {total_chunks} profile chunks...")
-        
-        for i, chunk in enumerate(profile_data):
-            try:
-                # Create embedding for each profile chunk
-                chunk_embedding = self.get_embedding(chunk)
-                if chunk_embedding is not None:
-                    self.embeddings_cache[chunk] = {
-                        'embedding': chunk_embedding,
-                        'content': chunk,
-                        'source_field': 'existing_field'
-                    }
-                
-                if (i + 1) % 5 == 0:
-                    print(f"📈 Processed {i + 1}/{total_chunks} profile chunks...")
-                
-                # Rate limiting
-                time.sleep(0.1)
-                
-            except Exception as e:
-                print(f"Error processing profile chunk {i}: {e}")
-                continue
-        
-        print(f"🎉 Successfully created embeddings for {len(self.embeddings_cache)} profile chunks!")
+
+        # Deduplicate (normalized) texts before spending API calls; duplicate
+        # chunks reuse the embedding computed for their first occurrence
+        unique_chunks = {}
+        for chunk in profile_data:
+            unique_chunks.setdefault(chunk.strip().lower(), chunk)
+
+        if len(unique_chunks) < total_chunks:
+            print(f"♻️ Skipping {total_chunks - len(unique_chunks)} duplicate chunks")
+
+        # One batched request per 100 unique chunks instead of one round-trip
+        # (plus a 100ms sleep) per chunk
+        embeddings = self.google_api.get_embeddings_batch(list(unique_chunks.values()))
+        embedding_by_norm = dict(zip(unique_chunks.keys(), embeddings))
+
+        for chunk in profile_data:
+            chunk_embedding = embedding_by_norm.get(chunk.strip().lower())
+            if chunk_embedding is not None:
+                self._append_entry(chunk, chunk_embedding, chunk, 'existing_field')
+
+        print(f"🎉 Successfully created embeddings for {self._size} profile chunks!")
     
+    def _normalize(self, embedding):
+        """L2-normalize one embedding in float32"""
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec = vec / norm
+        return vec
+
+    def _append_entry(self, text, embedding, content, source_field):
+        """Insert or update one entry in the structure-of-arrays store
+
+        Rows are stored L2-normalized so cosine similarity at query time
+        reduces to a single matrix-vector dot product. The in-memory matrix
+        is float16: the matvec is memory-bound, so halving the bytes moved
+        roughly halves its cost, and cosine ranking tolerates the precision
+        loss. Normalization still happens in float32 before the downcast.
+        """
+        vec = self._normalize(embedding)
+        existing = self._text_to_idx.get(text)
+        if existing is not None:
+            # Re-embedding of a known text: overwrite its row in place
+            self._matrix[existing] = vec
+            self._contents[existing] = content
+            self._source_fields[existing] = source_field
+            self._matrix_i8 = None
+            return
+        if self._matrix is None:
+            self._matrix = np.empty((64, vec.shape[0]), dtype=np.float16)
+        elif self._size == self._matrix.shape[0]:
+            grown = np.empty((self._matrix.shape[0] * 2, self._matrix.shape[1]), dtype=self._matrix.dtype)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+        self._matrix[self._size] = vec
+        self._texts.append(text)
+        self._contents.append(content)
+        self._source_fields.append(source_field)
+        self._text_to_idx[text] = self._size
+        self._size += 1
+
+    def get_embedding_matrix(self):
+        """Get the L2-normalized embedding matrix (filled rows) and parallel contents list"""
+        if self._matrix is None:
+            return None, []
+        matrix = self._matrix[:self._size]
+        # Scoring assumes a C-contiguous fixed-width block (BLAS/SimSIMD
+        # fast paths); stripped under python -O like all asserts
+        assert matrix.flags['C_CONTIGUOUS'] and matrix.dtype in (np.float16, np.float32)
+        return matrix, self._contents
+
+    def get_embedding_matrix_i8(self):
+        """Get an int8 copy of the normalized matrix for SIMD byte-dot scoring
+
+        Rows are unit-norm, so a single global factor of 127 quantizes them
+        without distorting cosine ranking (cosine is invariant to one global
+        scale — unlike the per-dimension scales used for the disk format).
+        Built lazily and rebuilt when the row count changes.
+        """
+        matrix, _ = self.get_embedding_matrix()
+        if matrix is None:
+            return None
+        if self._matrix_i8 is None or self._matrix_i8.shape[0] != matrix.shape[0]:
+            scaled = np.clip(np.round(np.asarray(matrix, dtype=np.float32) * 127.0), -127, 127)
+            self._matrix_i8 = np.ascontiguousarray(scaled.astype(np.int8))
+        return self._matrix_i8
+
     def save_embeddings(self):
-        """Save embeddings to pickle file"""
+        """Save embeddings as a .npy matrix plus a sidecar index"""
         try:
             # Ensure cache directory exists
             os.makedirs(os.path.dirname(self.embeddings_file), exist_ok=True)
-            with open(self.embeddings_file, 'wb') as f:
-                pickle.dump(self.embeddings_cache, f)
-            print(f"💾 Saved profile embeddings to {self.embeddings_file}")
+
+            if self._matrix is None:
+                return
+
+            matrix = np.ascontiguousarray(self._matrix[:self._size], dtype=np.float32)
+
+            # Quantize to int8 with a per-dimension scale: 4x fewer bytes on
+            # disk, and cosine ranking is barely affected by the precision loss
+            scale = np.max(np.abs(matrix), axis=0) / 127.0
+            scale[scale == 0] = 1.0
+            # .npy carries its own shape/dtype header and np.load can
+            # memory-map it directly, so the sidecar shape is informational
+            np.save(self.matrix_file, np.round(matrix / scale).astype(np.int8))
+
+            index = {
+                'shape': [int(matrix.shape[0]), int(matrix.shape[1])],
+                'normalized': True,
+                'dtype': 'int8',
+                'scale': scale.astype(np.float32).tolist(),
+                'entries': [
+                    {'text': text, 'content': content, 'source_field': source_field}
+                    for text, content, source_field
+                    in zip(self._texts, self._contents, self._source_fields)
+                ]
+            }
+            self._write_index(index)
+
+            print(f"💾 Saved profile embeddings to {self.matrix_file}")
         except Exception as e:
             print(f"Error saving embeddings: {e}")
+
+    def _write_index(self, index):
+        """Write the sidecar index (msgpack when available, pickle otherwise)"""
+        with open(self.index_file, 'wb') as f:
+            if msgpack is not None:
+                f.write(msgpack.packb(index))
+            else:
+                # Write-once, read-many: spend a little extra on the optimize
+                # pass so every subsequent load is smaller and faster
+                f.write(pickletools.optimize(
+                    pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def _read_index(self):
+        """Read the sidecar index written by _write_index"""
+        with open(self.index_file, 'rb') as f:
+            raw = f.read()
+        if msgpack is not None:
+            try:
+                return msgpack.unpackb(raw)
+            except Exception:
+                pass  # Index was written with the pickle fallback
+        return pickle.loads(raw)
+
+    def _cache_files_exist(self):
+        """Check whether a saved embedding cache (new or legacy format) is on disk"""
+        if os.path.exists(self.index_file):
+            if os.path.exists(self.matrix_file) or os.path.exists(self.legacy_matrix_file):
+                return True
+        return os.path.exists(self.embeddings_file)
+
+    def _load_cache_from_disk(self):
+        """Load the embedding cache from disk, preferring the memmap format
+
+        The matrix is memory-mapped so load time is O(1) and the OS pages
+        rows in on demand, instead of deserializing every embedding as
+        Python objects up front.
+        """
+        if os.path.exists(self.index_file) and (
+                os.path.exists(self.matrix_file) or os.path.exists(self.legacy_matrix_file)):
+            index = self._read_index()
+            rows, dims = index['shape']
+            if os.path.exists(self.matrix_file):
+                stored = np.load(self.matrix_file, mmap_mode='r')
+            else:
+                # Headerless .f32 dump from before the switch to .npy —
+                # shape and dtype come from the sidecar index
+                dtype = np.int8 if index.get('dtype') == 'int8' else np.float32
+                stored = np.memmap(self.legacy_matrix_file, dtype=dtype, mode='r', shape=(rows, dims))
+            if stored.dtype == np.int8:
+                scale = np.asarray(index['scale'], dtype=np.float32)
+                # Dequantize into the float16 in-memory format used by search
+                matrix = (stored.astype(np.float32) * scale).astype(np.float16)
+            else:
+                # float32 matrix from before quantization was introduced
+                matrix = stored
+            if not index.get('normalized'):
+                # Matrix written before rows were stored normalized —
+                # normalize in memory once so search can assume unit rows
+                matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                matrix = matrix / norms
+            self._matrix = matrix
+            self._size = rows
+            self._texts = [entry['text'] for entry in index['entries']]
+            self._contents = [entry['content'] for entry in index['entries']]
+            self._source_fields = [entry['source_field'] for entry in index['entries']]
+            self._text_to_idx = {text: i for i, text in enumerate(self._texts)}
+        else:
+            # Legacy pickle cache from older deployments
+            for text, data in self._read_embeddings_file().items():
+                self._append_entry(text, data['embedding'], data['content'],
+                                   data.get('source_field', 'existing_field'))
+
+    def _read_embeddings_file(self):
+        """Read the legacy embeddings pickle, handling both zstd and uncompressed files"""
+        with open(self.embeddings_file, 'rb') as f:
+            raw = f.read()
+        if zstandard is not None and raw[:4] == b'\x28\xb5\x2f\xfd':  # zstd magic bytes
+            raw = zstandard.ZstdDecompressor().decompress(raw)
+        return pickle.loads(raw)
     
     def get_embedding(self, text):
         """Get embedding using the configured AI provider"""
         return self.google_api.get_embedding(text)
     
+    def _load_query_cache(self):
+        """Load persisted user-query embeddings so repeat queries survive restarts"""
+        try:
+            if os.path.exists(self.query_cache_file):
+                with open(self.query_cache_file, 'rb') as f:
+                    raw = f.read()
+                if zstandard is not None and raw[:4] == b'\x28\xb5\x2f\xfd':  # zstd magic bytes
+                    raw = zstandard.ZstdDecompressor().decompress(raw)
+                cache = pickle.loads(raw)
+                print(f"✅ Loaded {len(cache)} query embeddings from cache")
+                return cache
+        except Exception as e:
+            print(f"Error loading query embedding cache: {e}")
+        return {}
+
+    def _save_query_cache(self):
+        """Save the user-query embedding cache to disk (zstd-compressed when available)"""
+        try:
+            os.makedirs(os.path.dirname(self.query_cache_file), exist_ok=True)
+            raw = pickle.dumps(self.user_query_cache, protocol=pickle.HIGHEST_PROTOCOL)
+            if zstandard is not None:
+                raw = zstandard.ZstdCompressor(level=3).compress(raw)
+            with open(self.query_cache_file, 'wb') as f:
+                f.write(raw)
+        except Exception as e:
+            print(f"Error saving query embedding cache: {e}")
+
     def get_cached_embedding(self, text):
-        """Get cached embedding or create new one"""
-        text_hash = hashlib.md5(text.encode()).hexdigest()
-        
+        """Get cached embedding or create new one
+
+        The cache key is normalized (strip + casefold) so trivial variants
+        of the same query — retries, different capitalization, stray
+        whitespace — hit the cache instead of repaying the embed call.
+        """
+        text_hash = _text_hash(text.strip().casefold())
+
         if text_hash in self.user_query_cache:
             return self.user_query_cache[text_hash]
-        
+
         embedding = self.get_embedding(text)
         if embedding is not None:
-            self.user_query_cache[text_hash] = embedding
+            # Store as float32 to keep the persisted cache compact
+            self.user_query_cache[text_hash] = np.asarray(embedding, dtype=np.float32)
+            self._save_query_cache()
         return embedding
     
     def get_embeddings_cache(self):
-        """Get the embeddings cache"""
-        return self.embeddings_cache
-    
+        """Get a dict view of the embeddings cache
+
+        The store itself is structure-of-arrays; this materializes the old
+        per-entry dict shape for callers that still want it. The scoring
+        path should use get_embedding_matrix instead.
+        """
+        return {
+            text: {
+                'embedding': self._matrix[idx],
+                'content': self._contents[idx],
+                'source_field': self._source_fields[idx]
+            }
+            for text, idx in self._text_to_idx.items()
+        }
+
     def get_cache_stats(self):
         """Get statistics about the embeddings cache"""
-        total_embeddings = len(self.embeddings_cache)
-        new_field_embeddings = sum(1 for data in self.embeddings_cache.values() 
-                                 if data.get('source_field') == 'new_field')
-        existing_field_embeddings = sum(1 for data in self.embeddings_cache.values() 
-                                      if data.get('source_field') == 'existing_field')
-        
+        new_field_embeddings = self._source_fields.count('new_field')
+        existing_field_embeddings = self._source_fields.count('existing_field')
+
         return {
-            'total': total_embeddings,
+            'total': self._size,
             'new_fields': new_field_embeddings,
             'existing_fields': existing_field_embeddings
         }
@@ -1,7 +1,101 @@
 import requests
 import json
 import os
-from api.config.env_loader import get_api_key
+import asyncio
+import random
+import threading
+import time
+from api.config.env_loader import get_api_key, get_max_history_turns
+from api.utils import history_db
+from api.utils.json_cache import load_json_cached
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:
+    httpx = None  # Fall back to sequential batch requests if httpx isn't installed
+
+# How many embedding batch requests to keep in flight at once
+MAX_CONCURRENT_EMBED_BATCHES = 4
+
+# Embedding request quota; adjust to the project's actual Gemini RPM limit
+EMBED_REQUESTS_PER_MINUTE = 3000
+
+class _TokenBucket:
+    """Thread-safe token bucket that only blocks when the quota is exhausted
+
+    Unlike a fixed sleep between calls, the bucket returns immediately while
+    capacity exists and waits exactly as long as needed once it runs dry.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.fill_rate = rate_per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = (1.0 - self.tokens) / self.fill_rate
+            time.sleep(wait)
+
+_EMBED_BUCKET = _TokenBucket(EMBED_REQUESTS_PER_MINUTE)
+
+# Shared async client: HTTP/2 multiplexes concurrent embed calls over one
+# TLS connection, so parallel requests don't pay per-connection handshakes
+_ACLIENT = None
+
+def _get_async_client():
+    global _ACLIENT
+    if _ACLIENT is None and httpx is not None:
+        _ACLIENT = httpx.AsyncClient(
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=20)
+        )
+    return _ACLIENT
+
+# Shared session so every call reuses warm TCP+TLS connections instead of
+# paying a fresh handshake per request
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+# Static system prompt template, built once at import time so the hot path
+# only pays for a single .format() call per request
+PROMPT_TEMPLATE = """You are Mushini Gopala Swamy, working as Senior Software Engineer.
+
+You are in the job search process and need to answer recruiters based on your profile.
+
+IMPORTANT: Base your responses primarily on the profile information provided below. If specific details aren't available, you can provide general professional responses or politely indicate that you don't have specific information about certain topics. Be helpful and conversational while staying truthful to your profile.
+
+PROFILE INFORMATION:
+{profile_summary}
+
+Context or Data:
+- {context_text}
+
+Please provide a clear, professional answer as if you are Mushini Gopala Swamy responding to a recruiter. Use the context information above to give accurate and helpful answers about your experience, skills, and preferences.
+
+If the context doesn't contain specific information about something, you can:
+- Provide general professional insights related to the topic
+- Politely mention that you don't have specific details about that particular aspect
+- Redirect the conversation to areas where you do have relevant information
+
+Remember to maintain consistency with your previous responses in the conversation history."""
 
 class GoogleGeminiAPI:
     """Google Gemini API implementation"""
@@ -10,85 +104,86 @@ class GoogleGeminiAPI:
         self.api_key = get_api_key()
         self.base_url = "https://generativelanguage.googleapis.com/v1beta"
         self.model = "gemini-2.0-flash"
-    
+        self.conversation_file = 'data/conversation_data.json'
+        self.profile_file = 'data/myprofile.json'
+        # Memoized by file mtime so the hot path skips JSON parsing and
+        # summary rendering unless the underlying file actually changed
+        self._conversation_mtime = None
+        self._conversation_history = None
+        self._profile_mtime = None
+        self._profile_summary = None
+        self._base_parts = None
+        self._base_parts_mtime = None
+
     def load_conversation_history(self):
-        """Load conversation history from JSON file"""
+        """Load recent conversation turns from the history database (cached by version)"""
         try:
-            conversation_file = 'data/conversation_data.json'
-            if os.path.exists(conversation_file):
-                with open(conversation_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            else:
-                print(f"Conversation file not found at: {conversation_file}")
-                return []
+            version = history_db.last_message_id()
+            if self._conversation_history is not None and version == self._conversation_mtime:
+                return self._conversation_history
+            # Sliding window: replaying every past turn grows prompt tokens
+            # (and latency/cost) linearly with chat length
+            self._conversation_history = history_db.load_recent_turns(get_max_history_turns())
+            self._conversation_mtime = version
+            return self._conversation_history
         except Exception as e:
             print(f"Error loading conversation history: {e}")
             return []
+
+    def _get_profile_summary(self):
+        """Get the rendered profile summary, re-building only when the file changes"""
+        try:
+            mtime = os.stat(self.profile_file).st_mtime
+        except OSError:
+            mtime = None
+        if self._profile_summary is None or mtime != self._profile_mtime:
+            self._profile_summary = self._create_profile_summary(self.load_profile_data())
+            self._profile_mtime = mtime
+        return self._profile_summary
     
-    def build_conversation_parts(self, conversation_history, current_query):
-        """Build the parts array with conversation history and current query"""
-        parts = []
-        
-        # Add conversation history
-        for conv in conversation_history:
-            # Add user question
-            parts.append({
-                "role": "user",
-                "parts": [{"text": conv["userQuestion"]}]
-            })
-            
-            # Add model answer
-            parts.append({
-                "role": "model", 
-                "parts": [{"text": conv["modelAnswer"]}]
-            })
-        
-        # Add current query
-        parts.append({
-            "role": "user",
-            "parts": [{"text": current_query}]
-        })
-        
-        return parts
+    def _get_base_parts(self):
+        """Get the conversation-history parts, rebuilt only when the history changes
+
+        The history turns are identical on every request, so the 2xN list of
+        role/parts dicts is built once and cached; only the current query turn
+        is appended per request.
+        """
+        conversation_history = self.load_conversation_history()
+        if self._base_parts is None or self._base_parts_mtime != self._conversation_mtime:
+            parts = []
+            for conv in conversation_history:
+                # Add user question
+                parts.append({
+                    "role": "user",
+                    "parts": [{"text": conv["userQuestion"]}]
+                })
+
+                # Add model answer
+                parts.append({
+                    "role": "model",
+                    "parts": [{"text": conv["modelAnswer"]}]
+                })
+            self._base_parts = parts
+            self._base_parts_mtime = self._conversation_mtime
+        return self._base_parts
     
     def generate_response_with_context(self, query, relevant_context):
         """Generate response using Google Gemini API with context and conversation history"""
         try:
             url = f'{self.base_url}/models/{self.model}:generateContent?key={self.api_key}'
             
-            # Load conversation history
-            conversation_history = self.load_conversation_history()
-            
-            # Build conversation parts
-            conversation_parts = self.build_conversation_parts(conversation_history, query)
-            
-            # Construct system prompt with context
-            context_text = "\n".join([f"- {ctx}" for ctx in relevant_context])
-            
-            # Get dynamic profile summary
-            profile_data = self.load_profile_data()
-            profile_summary = self._create_profile_summary(profile_data)
+            # Cached history parts plus the current query turn
+            conversation_parts = self._get_base_parts() + [{
+                "role": "user",
+                "parts": [{"text": query}]
+            }]
             
-            system_prompt = f"""You are Mushini Gopala Swamy, working as Senior Software Engineer.
-
-You are in the job search process and need to answer recruiters based on your profile.
-
-IMPORTANT: Base your responses primarily on the profile information provided below. If specific details aren't available, you can provide general professional responses or politely indicate that you don't have specific information about certain topics. Be helpful and conversational while staying truthful to your profile.
-
-PROFILE INFORMATION:
-{profile_summary}
-
-Context or Data:
-{context_text}
-
-Please provide a clear, professional answer as if you are Mushini Gopala Swamy responding to a recruiter. Use the context information above to give accurate and helpful answers about your experience, skills, and preferences. 
-
-If the context doesn't contain specific information about something, you can:
-- Provide general professional insights related to the topic
-- Politely mention that you don't have specific details about that particular aspect
-- Redirect the conversation to areas where you do have relevant information
-
-Remember to maintain consistency with your previous responses in the conversation history."""
+            # Fill in the static template; '\n- '.join avoids building an
+            # intermediate list just to bullet the context chunks
+            system_prompt = PROMPT_TEMPLATE.format(
+                profile_summary=self._get_profile_summary(),
+                context_text='\n- '.join(relevant_context)
+            )
 
             # Create the request payload with conversation history
             data = {
@@ -104,7 +199,7 @@ Remember to maintain consistency with your previous responses in the conversatio
             print(f"🤖 Sending request to Google Gemini with {len(conversation_parts)} conversation parts")
             print(f"📝 Current query: {query}")
             
-            response = requests.post(url, json=data, timeout=15)
+            response = _SESSION.post(url, json=data, timeout=15)
             
             if response.status_code == 200:
                 result = response.json()
@@ -117,19 +212,73 @@ Remember to maintain consistency with your previous responses in the conversatio
             print(f"Error generating response with Google Gemini: {e}")
             return f"Sorry, I encountered an error: {str(e)}"
     
+    def stream_response_with_context(self, query, relevant_context):
+        """Stream the response from Gemini, yielding text chunks as they arrive
+
+        Uses the streamGenerateContent SSE endpoint so the first token shows
+        up after ~200-400ms instead of waiting for the full generation.
+        """
+        try:
+            url = f'{self.base_url}/models/{self.model}:streamGenerateContent?alt=sse&key={self.api_key}'
+
+            conversation_parts = self._get_base_parts() + [{
+                "role": "user",
+                "parts": [{"text": query}]
+            }]
+
+            data = {
+                "contents": conversation_parts,
+                "generationConfig": {
+                    "temperature": 0.7,
+                    "topK": 40,
+                    "topP": 0.95,
+                    "maxOutputTokens": 1024,
+                }
+            }
+
+            print(f"🤖 Streaming request to Google Gemini with {len(conversation_parts)} conversation parts")
+
+            response = _SESSION.post(url, json=data, stream=True, timeout=15)
+
+            if response.status_code != 200:
+                print(f"Google Gemini API error: {response.status_code} - {response.text}")
+                yield f"Sorry, I encountered an error. Please try again. (Error: {response.status_code})"
+                return
+
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                line = line.decode('utf-8')
+                if not line.startswith('data: '):
+                    continue
+                payload = line[len('data: '):]
+                if payload == '[DONE]':
+                    break
+                try:
+                    event = json.loads(payload)
+                    text = event['candidates'][0]['content']['parts'][0]['text']
+                except (ValueError, KeyError, IndexError):
+                    continue
+                yield text
+
+        except Exception as e:
+            print(f"Error streaming response with Google Gemini: {e}")
+            yield f"Sorry, I encountered an error: {str(e)}"
+
     def get_embedding(self, text):
         """Get embedding from Google Gemini Embedding API"""
         try:
             url = f'{self.base_url}/models/gemini-embedding-001:embedContent?key={self.api_key}'
-            
+
             data = {
                 "model": "models/gemini-embedding-001",
                 "content": {
                     "parts": [{"text": text}]
                 }
             }
-            
-            response = requests.post(url, json=data, timeout=10)
+
+            _EMBED_BUCKET.acquire()
+            response = _SESSION.post(url, json=data, timeout=10)
             
             if response.status_code == 200:
                 result = response.json()
@@ -142,15 +291,124 @@ Remember to maintain consistency with your previous responses in the conversatio
             print(f"Error getting Google embedding: {e}")
             return None
 
+    def _build_batch_payload(self, batch):
+        """Build the batchEmbedContents request payload for one batch of texts"""
+        return {
+            "requests": [
+                {
+                    "model": "models/gemini-embedding-001",
+                    "content": {"parts": [{"text": text}]}
+                }
+                for text in batch
+            ]
+        }
+
+    def get_embeddings_batch(self, texts, batch_size=100):
+        """Get embeddings for many texts via the batchEmbedContents endpoint
+
+        Sends up to batch_size texts per request (Gemini's per-batch limit is
+        100), cutting network round-trips by the batch factor compared to one
+        embedContent call per text. When httpx is available, multiple batch
+        requests are dispatched concurrently with bounded concurrency.
+        Returns a list of embeddings aligned with the input order, with None
+        for any batch that failed.
+        """
+        embeddings = []
+        try:
+            url = f'{self.base_url}/models/gemini-embedding-001:batchEmbedContents?key={self.api_key}'
+            batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+
+            if httpx is not None and len(batches) > 1:
+                return asyncio.run(self._aembed_batches(url, batches))
+
+            for batch in batches:
+                _EMBED_BUCKET.acquire()
+                response = _SESSION.post(url, json=self._build_batch_payload(batch), timeout=30)
+
+                if response.status_code == 200:
+                    result = response.json()
+                    embeddings.extend(emb['values'] for emb in result['embeddings'])
+                else:
+                    print(f"Google Batch Embedding API error: {response.status_code} - {response.text}")
+                    embeddings.extend(None for _ in batch)
+
+            return embeddings
+
+        except Exception as e:
+            print(f"Error getting Google batch embeddings: {e}")
+            # Pad out so results stay aligned with the input texts
+            embeddings.extend(None for _ in range(len(texts) - len(embeddings)))
+            return embeddings
+
+    async def _aget_embedding_batch(self, client, semaphore, url, batch):
+        """POST one embedding batch with bounded concurrency and 429 backoff"""
+        async with semaphore:
+            for attempt in range(3):
+                response = await client.post(url, json=self._build_batch_payload(batch))
+                if response.status_code == 200:
+                    result = response.json()
+                    return [emb['values'] for emb in result['embeddings']]
+                if response.status_code == 429:
+                    # Honor Retry-After, with exponential backoff + jitter
+                    retry_after = float(response.headers.get('Retry-After', 2 ** attempt))
+                    await asyncio.sleep(retry_after + random.uniform(0, 0.5))
+                    continue
+                print(f"Google Batch Embedding API error: {response.status_code} - {response.text}")
+                return [None for _ in batch]
+        return [None for _ in batch]
+
+    async def _aembed_batches(self, url, batches):
+        """Dispatch all embedding batches concurrently, preserving input order"""
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_EMBED_BATCHES)
+        # Scoped client here because this runs under asyncio.run, whose loop
+        # is torn down afterwards; the shared _ACLIENT is for callers that
+        # live inside a persistent event loop
+        async with httpx.AsyncClient(http2=True, timeout=30.0,
+                                     limits=httpx.Limits(max_connections=20)) as client:
+            tasks = [self._aget_embedding_batch(client, semaphore, url, batch) for batch in batches]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        embeddings = []
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                print(f"Error getting Google batch embeddings: {result}")
+                embeddings.extend(None for _ in batch)
+            else:
+                embeddings.extend(result)
+        return embeddings
+
+    async def aget_embedding(self, text):
+        """Async variant of get_embedding using the shared HTTP/2 client"""
+        client = _get_async_client()
+        if client is None:
+            return self.get_embedding(text)
+        try:
+            url = f'{self.base_url}/models/gemini-embedding-001:embedContent?key={self.api_key}'
+            data = {
+                "model": "models/gemini-embedding-001",
+                "content": {
+                    "parts": [{"text": text}]
+                }
+            }
+
+            response = await client.post(url, json=data)
+
+            if response.status_code == 200:
+                return response.json()['embedding']['values']
+            print(f"Google Embedding API error: {response.status_code} - {response.text}")
+            return None
+
+        except Exception as e:
+            print(f"Error getting Google embedding: {e}")
+            return None
+
     def load_profile_data(self):
         """Load profile data from JSON file"""
         try:
-            profile_file = 'data/myprofile.json'
-            if os.path.exists(profile_file):
-                with open(profile_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            if os.path.exists(self.profile_file):
+                return load_json_cached(self.profile_file)
             else:
-                print(f"Profile file not found at: {profile_file}")
+                print(f"Profile file not found at: {self.profile_file}")
                 return {}
         except Exception as e:
             print(f"Error loading profile data: {e}")
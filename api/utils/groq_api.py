@@ -1,6 +1,38 @@
-import json
 import os
-from api.config.env_loader import get_groq_api_key
+from api.config.env_loader import get_groq_api_key, get_max_history_turns
+from api.utils import history_db
+from api.utils.json_cache import load_json_cached
+
+try:
+    from groq import Groq
+except ImportError:
+    Groq = None  # Groq SDK not installed; only matters when MODEL=GROQ
+
+def _format_skills(skills):
+    """Summarize the skills dict as 'category: first three items; ...'"""
+    return '; '.join(
+        f"{category}: {', '.join(skill_list[:3])}"
+        for category, skill_list in skills.items()
+        if isinstance(skill_list, list)
+    )
+
+# Declarative projection of profile fields into summary lines:
+# (profile key, label, value formatter)
+_PROFILE_FIELDS = (
+    ('name', 'Name', str),
+    ('current_role', 'Current Role', str),
+    ('current_company', 'Company', str),
+    ('experience_years', 'Experience', lambda v: f"{v} years"),
+    ('current_location', 'Location', str),
+    ('skills', 'Key Skills', _format_skills),
+)
+
+# Same shape, but read from the job_preferences sub-dict
+_PREFERENCE_FIELDS = (
+    ('current_ctc', 'Current CTC', str),
+    ('expected_ctc', 'Expected CTC', str),
+    ('negotiable_notice_period', 'Notice Period', lambda v: f"{v} days"),
+)
 
 class GroqAPI:
     """Groq API implementation"""
@@ -8,43 +40,80 @@ class GroqAPI:
     def __init__(self):
         self.api_key = get_groq_api_key()
         self.model = "openai/gpt-oss-120b"  # You can change this to other Groq models
-    
+        if Groq is None:
+            raise Exception("groq package not installed - run: pip install groq")
+        # One client for the lifetime of the provider so the underlying HTTP
+        # connection pool is reused across requests
+        self.client = Groq(api_key=self.api_key)
+        self.conversation_file = 'data/conversation_data.json'
+        self.profile_file = 'data/myprofile.json'
+        # Memoized by file mtime so build_messages skips JSON parsing and
+        # summary rendering unless the underlying file actually changed
+        self._conversation_mtime = None
+        self._conversation_history = None
+        self._profile_mtime = None
+        self._profile_summary = None
+        self._base_messages = None
+        self._base_messages_mtime = None
+
     def load_conversation_history(self):
-        """Load conversation history from JSON file"""
+        """Load recent conversation turns from the history database (cached by version)"""
         try:
-            conversation_file = 'data/conversation_data.json'
-            if os.path.exists(conversation_file):
-                with open(conversation_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            else:
-                print(f"Conversation file not found at: {conversation_file}")
-                return []
+            version = history_db.last_message_id()
+            if self._conversation_history is not None and version == self._conversation_mtime:
+                return self._conversation_history
+            # Sliding window: replaying every past turn grows prompt tokens
+            # (and latency/cost) linearly with chat length
+            self._conversation_history = history_db.load_recent_turns(get_max_history_turns())
+            self._conversation_mtime = version
+            return self._conversation_history
         except Exception as e:
             print(f"Error loading conversation history: {e}")
             return []
-    
+
     def load_profile_data(self):
         """Load profile data from JSON file"""
         try:
-            profile_file = 'data/myprofile.json'
-            if os.path.exists(profile_file):
-                with open(profile_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            if os.path.exists(self.profile_file):
+                return load_json_cached(self.profile_file)
             else:
-                print(f"Profile file not found at: {profile_file}")
+                print(f"Profile file not found at: {self.profile_file}")
                 return {}
         except Exception as e:
             print(f"Error loading profile data: {e}")
             return {}
+
+    def _get_profile_summary(self):
+        """Get the rendered profile summary, re-building only when the file changes"""
+        try:
+            mtime = os.stat(self.profile_file).st_mtime
+        except OSError:
+            mtime = None
+        if self._profile_summary is None or mtime != self._profile_mtime:
+            self._profile_summary = self._create_profile_summary(self.load_profile_data())
+            self._profile_mtime = mtime
+        return self._profile_summary
     
-    def build_messages(self, query, relevant_context, conversation_history):
+    def _get_base_messages(self):
+        """Get the conversation-history messages, rebuilt only when the history changes"""
+        conversation_history = self.load_conversation_history()
+        if self._base_messages is None or self._base_messages_mtime != self._conversation_mtime:
+            messages = []
+            for conv in conversation_history:
+                messages.append({"role": "user", "content": conv["userQuestion"]})
+                messages.append({"role": "assistant", "content": conv["modelAnswer"]})
+            self._base_messages = messages
+            self._base_messages_mtime = self._conversation_mtime
+        return self._base_messages
+
+    def build_messages(self, query, relevant_context):
         """Build messages array for Groq API"""
         messages = []
-        
+
         # System message with profile context
-        profile_data = self.load_profile_data()
-        profile_summary = self._create_profile_summary(profile_data)
-        
+        profile_summary = self._get_profile_summary()
+        context_text = "\n".join(f"- {ctx}" for ctx in relevant_context)
+
         system_message = f"""You are Mushini Gopala Swamy, working as Senior Software Engineer.
 
 You are in the job search process and need to answer recruiters based on your profile.
@@ -55,7 +124,7 @@ PROFILE INFORMATION:
 {profile_summary}
 
 RELEVANT CONTEXT FOR THIS QUESTION:
-{chr(10).join([f"- {ctx}" for ctx in relevant_context])}
+{context_text}
 
 Please provide a clear, professional answer as if you are Mushini Gopala Swamy responding to a recruiter. Use the profile information and context above to give accurate and helpful answers about your experience, skills, and preferences.
 
@@ -67,75 +136,41 @@ If the context doesn't contain specific information about something, you can:
 Remember to maintain consistency with your previous responses in the conversation history."""
         
         messages.append({"role": "system", "content": system_message})
-        
-        # Add conversation history
-        for conv in conversation_history:
-            messages.append({"role": "user", "content": conv["userQuestion"]})
-            messages.append({"role": "assistant", "content": conv["modelAnswer"]})
-        
+
+        # Add cached conversation history
+        messages.extend(self._get_base_messages())
+
         # Add current query
         messages.append({"role": "user", "content": query})
-        
+
         return messages
     
     def _create_profile_summary(self, profile_data):
-        """Create a concise summary of profile data"""
+        """Create a concise summary of profile data from the declarative field table"""
         summary_parts = []
-        
-        # Basic info
-        if profile_data.get('name'):
-            summary_parts.append(f"Name: {profile_data['name']}")
-        if profile_data.get('current_role'):
-            summary_parts.append(f"Current Role: {profile_data['current_role']}")
-        if profile_data.get('current_company'):
-            summary_parts.append(f"Company: {profile_data['current_company']}")
-        if profile_data.get('experience_years'):
-            summary_parts.append(f"Experience: {profile_data['experience_years']} years")
-        if profile_data.get('current_location'):
-            summary_parts.append(f"Location: {profile_data['current_location']}")
-        
-        # Skills summary
-        if profile_data.get('skills'):
-            skills = profile_data['skills']
-            skill_summary = []
-            for category, skill_list in skills.items():
-                if isinstance(skill_list, list):
-                    skill_summary.append(f"{category}: {', '.join(skill_list[:3])}")
-            if skill_summary:
-                summary_parts.append(f"Key Skills: {'; '.join(skill_summary)}")
-        
-        # Job preferences
-        if profile_data.get('job_preferences'):
-            prefs = profile_data['job_preferences']
-            if prefs.get('current_ctc'):
-                summary_parts.append(f"Current CTC: {prefs['current_ctc']}")
-            if prefs.get('expected_ctc'):
-                summary_parts.append(f"Expected CTC: {prefs['expected_ctc']}")
-            if prefs.get('negotiable_notice_period'):
-                summary_parts.append(f"Notice Period: {prefs['negotiable_notice_period']} days")
-        
+
+        for source, fields in ((profile_data, _PROFILE_FIELDS),
+                               (profile_data.get('job_preferences') or {}, _PREFERENCE_FIELDS)):
+            for key, label, formatter in fields:
+                value = source.get(key)
+                if value:
+                    formatted = formatter(value)
+                    if formatted:
+                        summary_parts.append(f"{label}: {formatted}")
+
         return "\n".join(summary_parts)
     
     def generate_response_with_context(self, query, relevant_context):
         """Generate response using Groq API with context and conversation history"""
         try:
-            # Import Groq client here to avoid import issues
-            from groq import Groq
-            
-            # Load conversation history
-            conversation_history = self.load_conversation_history()
-            
-            # Build messages for Groq
-            messages = self.build_messages(query, relevant_context, conversation_history)
-            
-            # Create Groq client
-            client = Groq(api_key=self.api_key)
-            
+            # Build messages for Groq (history comes from the cached base messages)
+            messages = self.build_messages(query, relevant_context)
+
             print(f"🤖 Sending request to Groq with {len(messages)} messages")
             print(f"📝 Current query: {query}")
-            
+
             # Create completion
-            completion = client.chat.completions.create(
+            completion = self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=0.7,
@@ -151,3 +186,28 @@ Remember to maintain consistency with your previous responses in the conversatio
         except Exception as e:
             print(f"Error generating response with Groq: {e}")
             return f"Sorry, I encountered an error: {str(e)}"
+
+    def stream_response_with_context(self, query, relevant_context):
+        """Stream the response from Groq, yielding text chunks as they arrive"""
+        try:
+            messages = self.build_messages(query, relevant_context)
+
+            print(f"🤖 Streaming request to Groq with {len(messages)} messages")
+
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1024,
+                top_p=0.95,
+                stream=True
+            )
+
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+
+        except Exception as e:
+            print(f"Error streaming response with Groq: {e}")
+            yield f"Sorry, I encountered an error: {str(e)}"
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+import time
+from api.utils.json_cache import load_json_cached
+
+DB_FILE = 'data/history.db'
+SEED_FILE = 'data/conversation_data.json'
+
+# How many past turns a history read returns by default
+DEFAULT_WINDOW = 20
+
+_conn = None
+_lock = threading.Lock()
+
+def _get_conn():
+    """Get the shared SQLite connection, creating and seeding the database once"""
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
+        conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        # WAL lets readers proceed during appends; NORMAL sync is plenty for
+        # chat history and avoids an fsync per insert
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS messages ('
+            'id INTEGER PRIMARY KEY, role TEXT NOT NULL, '
+            'content TEXT NOT NULL, ts INTEGER NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages(ts)')
+        _seed_from_json(conn)
+        _conn = conn
+    return _conn
+
+def _seed_from_json(conn):
+    """One-time migration of the legacy JSON history into the database"""
+    if conn.execute('SELECT 1 FROM messages LIMIT 1').fetchone() is not None:
+        return
+    if not os.path.exists(SEED_FILE):
+        return
+    try:
+        turns = load_json_cached(SEED_FILE)
+    except Exception as e:
+        print(f"Error seeding history database: {e}")
+        return
+    now = int(time.time())
+    rows = []
+    for conv in turns:
+        rows.append(('user', conv['userQuestion'], now))
+        rows.append(('assistant', conv['modelAnswer'], now))
+    with conn:
+        conn.executemany('INSERT INTO messages (role, content, ts) VALUES (?, ?, ?)', rows)
+    print(f"💾 Seeded history database with {len(turns)} turns from {SEED_FILE}")
+
+def append_turn(question, answer):
+    """Append one question/answer turn — an incremental INSERT, no file rewrite"""
+    conn = _get_conn()
+    ts = int(time.time())
+    with _lock, conn:
+        conn.execute("INSERT INTO messages (role, content, ts) VALUES (?, ?, ?)",
+                     ('user', question, ts))
+        conn.execute("INSERT INTO messages (role, content, ts) VALUES (?, ?, ?)",
+                     ('assistant', answer, ts))
+
+def load_recent_turns(limit=DEFAULT_WINDOW):
+    """Load the last `limit` turns as userQuestion/modelAnswer pairs
+
+    Reads are bounded by the window size rather than the full history, so
+    they stay O(limit) no matter how long the conversation grows. Falls
+    back to the seed JSON file if the database can't be opened.
+    """
+    try:
+        conn = _get_conn()
+        rows = conn.execute(
+            'SELECT role, content FROM messages ORDER BY id DESC LIMIT ?',
+            (limit * 2,)
+        ).fetchall()
+    except Exception as e:
+        print(f"Error reading history database: {e}")
+        try:
+            turns = load_json_cached(SEED_FILE)
+            return turns[-limit:]
+        except Exception:
+            return []
+
+    rows.reverse()
+    turns = []
+    question = None
+    for role, content in rows:
+        if role == 'user':
+            question = content
+        elif role == 'assistant' and question is not None:
+            turns.append({'userQuestion': question, 'modelAnswer': content})
+            question = None
+    return turns
+
+def last_message_id():
+    """Monotonic version token for history caches (max rowid, 0 when empty)"""
+    try:
+        conn = _get_conn()
+        row = conn.execute('SELECT MAX(id) FROM messages').fetchone()
+        return row[0] or 0
+    except Exception:
+        return 0
@@ -0,0 +1,28 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # Fall back to stdlib json if orjson isn't installed
+
+# Parsed JSON keyed by path, stored as (mtime, parsed_obj)
+_cache = {}
+
+def load_json_cached(path):
+    """Load and parse a JSON file, cached by file mtime
+
+    Re-parses only when os.stat reports a new mtime, so hot paths pay one
+    stat syscall instead of an O(file-size) JSON parse per call. Parsing
+    uses orjson when available (2-5x faster than stdlib json).
+    """
+    st = os.stat(path)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == st.st_mtime:
+        return cached[1]
+
+    with open(path, 'rb') as f:
+        raw = f.read()
+    parsed = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    _cache[path] = (st.st_mtime, parsed)
+    return parsed
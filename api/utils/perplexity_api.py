@@ -1,7 +1,100 @@
 import requests
 import json
 import os
-from api.config.env_loader import get_perplexity_api_key
+import re
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from api.config.env_loader import get_max_history_turns, get_perplexity_api_key
+from api.utils import history_db
+from api.utils.json_cache import load_json_cached
+
+try:
+    import httpx
+except ImportError:
+    httpx = None  # Fall back to the synchronous requests session if httpx isn't installed
+
+# Shared async client: HTTP/2 multiplexes concurrent generations over one
+# TLS connection, and the event loop stays free while a call is in flight
+_ACLIENT = None
+
+def _get_async_client():
+    global _ACLIENT
+    if _ACLIENT is None and httpx is not None:
+        _ACLIENT = httpx.AsyncClient(
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=10)
+        )
+    return _ACLIENT
+
+# Compiled once at import: the response cleanup runs on every generation
+# (and every streamed chunk), so the hot path skips re-compilation lookups
+_CITATION_RE = re.compile(r'\[\d+\]')
+_WS_RE = re.compile(r'\s+')
+
+# Static system template: everything here is byte-stable across turns so
+# provider-side prompt caching can reuse the prefix. Per-question context is
+# deliberately kept out and sent with the query instead.
+SYSTEM_TEMPLATE = """You are Mushini Gopala Swamy, working as Senior Software Engineer.
+
+You are in the job search process and need to answer recruiters based on your profile.
+
+IMPORTANT: Base your responses primarily on the profile information provided below. If specific details aren't available, you can provide general professional responses or politely indicate that you don't have specific information about certain topics. Be helpful and conversational while staying truthful to your profile.
+
+PROFILE INFORMATION:
+{profile_summary}
+
+Please provide a clear, professional answer as if you are Mushini Gopala Swamy responding to a recruiter. Use the profile information and the per-question context to give accurate and helpful answers about your experience, skills, and preferences.
+
+If the context doesn't contain specific information about something, you can:
+- Provide general professional insights related to the topic
+- Politely mention that you don't have specific details about that particular aspect
+- Redirect the conversation to areas where you do have relevant information
+
+Remember to maintain consistency with your previous responses in the conversation history."""
+
+@lru_cache(maxsize=4)
+def _summary_from_profile_json(profile_json):
+    """Render the profile summary from its canonical JSON form
+
+    Keyed on the sorted-keys JSON string, so identical profile content —
+    even after a spurious mtime bump — costs one hashmap hit instead of
+    re-walking every field and re-doing the title-casing string work.
+    """
+    profile_data = json.loads(profile_json)
+    summary_parts = []
+
+    # Process all fields dynamically
+    for key, value in profile_data.items():
+        if value and key not in ['_id', 'created_at', 'updated_at']:  # Skip metadata fields
+            if isinstance(value, str) and len(value) < 100:
+                # Short string fields
+                summary_parts.append(f"{key.replace('_', ' ').title()}: {value}")
+            elif isinstance(value, (int, float)):
+                # Numeric fields
+                if key == 'experience_years':
+                    summary_parts.append(f"Experience: {value} years")
+                else:
+                    summary_parts.append(f"{key.replace('_', ' ').title()}: {value}")
+            elif isinstance(value, list) and len(value) > 0:
+                # Array fields - show first few items
+                if len(value) <= 3:
+                    summary_parts.append(f"{key.replace('_', ' ').title()}: {', '.join(str(item) for item in value)}")
+                else:
+                    summary_parts.append(f"{key.replace('_', ' ').title()}: {', '.join(str(item) for item in value[:3])}...")
+            elif isinstance(value, dict) and value:
+                # Nested objects - show key fields
+                nested_summary = []
+                for nested_key, nested_value in value.items():
+                    if nested_value and isinstance(nested_value, (str, int, float)):
+                        nested_summary.append(f"{nested_key.replace('_', ' ').title()}: {nested_value}")
+                    elif isinstance(nested_value, list) and nested_value:
+                        nested_summary.append(f"{nested_key.replace('_', ' ').title()}: {', '.join(str(item) for item in nested_value[:2])}")
+
+                if nested_summary:
+                    summary_parts.append(f"{key.replace('_', ' ').title()}: {'; '.join(nested_summary)}")
+
+    return "\n".join(summary_parts)
 
 class PerplexityAPI:
     """Perplexity API implementation"""
@@ -10,17 +103,48 @@ class PerplexityAPI:
         self.api_key = get_perplexity_api_key()
         self.base_url = "https://api.perplexity.ai/chat/completions"
         self.model = "sonar-pro"  # You can change this to other models like "llama-3.1-sonar-small-128k"
+        # Pooled session keeps the TLS connection warm across turns instead
+        # of paying DNS + TCP + TLS handshake on every request
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=10)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        })
+        self.profile_file = 'data/myprofile.json'
+        # Memoized system message, rebuilt only when the profile file changes
+        # so the prompt prefix stays byte-identical across turns
+        self._profile_mtime = None
+        self._system_message = None
+
+    def _get_system_message(self):
+        """Get the static system message, re-rendering only on profile change"""
+        try:
+            mtime = os.stat(self.profile_file).st_mtime
+        except OSError:
+            mtime = None
+        if self._system_message is None or mtime != self._profile_mtime:
+            profile_summary = self._create_profile_summary(self.load_profile_data())
+            self._system_message = SYSTEM_TEMPLATE.format(profile_summary=profile_summary)
+            self._profile_mtime = mtime
+        return self._system_message
+
+    def __del__(self):
+        try:
+            self.session.close()
+        except Exception:
+            pass
     
     def load_conversation_history(self):
-        """Load conversation history from JSON file"""
+        """Load recent conversation turns from the history database
+
+        Bounded to MAX_HISTORY_TURNS: replaying every past turn grows
+        prompt tokens (and latency/cost) linearly with chat length.
+        """
         try:
-            conversation_file = 'data/conversation_data.json'
-            if os.path.exists(conversation_file):
-                with open(conversation_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            else:
-                print(f"Conversation file not found at: {conversation_file}")
-                return []
+            return history_db.load_recent_turns(get_max_history_turns())
         except Exception as e:
             print(f"Error loading conversation history: {e}")
             return []
@@ -30,8 +154,7 @@ class PerplexityAPI:
         try:
             profile_file = 'data/myprofile.json'
             if os.path.exists(profile_file):
-                with open(profile_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return load_json_cached(profile_file)
             else:
                 print(f"Profile file not found at: {profile_file}")
                 return {}
@@ -40,82 +163,32 @@ class PerplexityAPI:
             return {}
     
     def build_messages(self, query, relevant_context, conversation_history):
-        """Build messages array for Perplexity API"""
-        messages = []
-        
-        # System message with profile context
-        profile_data = self.load_profile_data()
-        profile_summary = self._create_profile_summary(profile_data)
-        
-        system_message = f"""You are Mushini Gopala Swamy, working as Senior Software Engineer.
-
-You are in the job search process and need to answer recruiters based on your profile.
-
-IMPORTANT: Base your responses primarily on the profile information provided below. If specific details aren't available, you can provide general professional responses or politely indicate that you don't have specific information about certain topics. Be helpful and conversational while staying truthful to your profile.
-
-PROFILE INFORMATION:
-{profile_summary}
+        """Build messages array for Perplexity API
 
-RELEVANT CONTEXT FOR THIS QUESTION:
-{chr(10).join([f"- {ctx}" for ctx in relevant_context])}
-
-Please provide a clear, professional answer as if you are Mushini Gopala Swamy responding to a recruiter. Use the profile information and context above to give accurate and helpful answers about your experience, skills, and preferences.
-
-If the context doesn't contain specific information about something, you can:
-- Provide general professional insights related to the topic
-- Politely mention that you don't have specific details about that particular aspect
-- Redirect the conversation to areas where you do have relevant information
+        The system message and history are byte-stable across turns; the
+        retrieved context rides along with the current query in the final
+        user message so it never invalidates the cached prefix.
+        """
+        messages = [{"role": "system", "content": self._get_system_message()}]
 
-Remember to maintain consistency with your previous responses in the conversation history."""
-        
-        messages.append({"role": "system", "content": system_message})
-        
         # Add conversation history
         for conv in conversation_history:
             messages.append({"role": "user", "content": conv["userQuestion"]})
             messages.append({"role": "assistant", "content": conv["modelAnswer"]})
-        
-        # Add current query
-        messages.append({"role": "user", "content": query})
-        
+
+        # Add current query with its per-question context
+        context_text = "\n".join(f"- {ctx}" for ctx in relevant_context)
+        messages.append({
+            "role": "user",
+            "content": f"Relevant context for this question:\n{context_text}\n\n{query}"
+        })
+
         return messages
     
     def _create_profile_summary(self, profile_data):
-        """Create a concise summary of profile data dynamically"""
-        summary_parts = []
-        
-        # Process all fields dynamically
-        for key, value in profile_data.items():
-            if value and key not in ['_id', 'created_at', 'updated_at']:  # Skip metadata fields
-                if isinstance(value, str) and len(value) < 100:
-                    # Short string fields
-                    summary_parts.append(f"{key.replace('_', ' ').title()}: {value}")
-                elif isinstance(value, (int, float)):
-                    # Numeric fields
-                    if key == 'experience_years':
-                        summary_parts.append(f"Experience: {value} years")
-                    else:
-                        summary_parts.append(f"{key.replace('_', ' ').title()}: {value}")
-                elif isinstance(value, list) and len(value) > 0:
-                    # Array fields - show first few items
-                    if len(value) <= 3:
-                        summary_parts.append(f"{key.replace('_', ' ').title()}: {', '.join(str(item) for item in value)}")
-                    else:
-                        summary_parts.append(f"{key.replace('_', ' ').title()}: {', '.join(str(item) for item in value[:3])}...")
-                elif isinstance(value, dict) and value:
-                    # Nested objects - show key fields
-                    nested_summary = []
-                    for nested_key, nested_value in value.items():
-                        if nested_value and isinstance(nested_value, (str, int, float)):
-                            nested_summary.append(f"{nested_key.replace('_', ' ').title()}: {nested_value}")
-                        elif isinstance(nested_value, list) and nested_value:
-                            nested_summary.append(f"{nested_key.replace('_', ' ').title()}: {', '.join(str(item) for item in nested_value[:2])}")
-                    
-                    if nested_summary:
-                        summary_parts.append(f"{key.replace('_', ' ').title()}: {'; '.join(nested_summary)}")
-        
-        return "\n".join(summary_parts)
-    
+        """Create a concise summary of profile data (memoized by content)"""
+        return _summary_from_profile_json(json.dumps(profile_data, sort_keys=True))
+
     def generate_response_with_context(self, query, relevant_context):
         """Generate response using Perplexity API with context and conversation history"""
         try:
@@ -138,27 +211,17 @@ Remember to maintain consistency with your previous responses in the conversatio
                 "disable_search": True
             }
             
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
             print(f"🤖 Sending request to Perplexity with {len(messages)} messages")
             print(f"📝 Current query: {query}")
-            
-            response = requests.post(self.base_url, headers=headers, json=payload, timeout=30)
+
+            response = self.session.post(self.base_url, json=payload, timeout=30)
             
             if response.status_code == 200:
                 result = response.json()
                 response_text = result["choices"][0]['message']['content']
-                
-                # Remove citation markers like [1], [2], [3], etc.
-                import re
-                cleaned_response = re.sub(r'\[\d+\]', '', response_text)
-                # Also remove any extra spaces that might be left
-                cleaned_response = re.sub(r'\s+', ' ', cleaned_response).strip()
-                
-                return cleaned_response
+
+                # Remove citation markers like [1] and collapse leftover spaces
+                return _WS_RE.sub(' ', _CITATION_RE.sub('', response_text)).strip()
             else:
                 print(f"Perplexity API error: {response.status_code} - {response.text}")
                 return f"Sorry, I encountered an error. Please try again. (Error: {response.status_code})"
@@ -166,3 +229,114 @@ Remember to maintain consistency with your previous responses in the conversatio
         except Exception as e:
             print(f"Error generating response with Perplexity: {e}")
             return f"Sorry, I encountered an error: {str(e)}"
+
+    async def agenerate_response_with_context(self, query, relevant_context):
+        """Async variant of generate_response_with_context using the shared HTTP/2 client
+
+        Awaiting the call frees the event loop for other requests instead of
+        blocking a worker thread for the full generation time.
+        """
+        client = _get_async_client()
+        if client is None:
+            return self.generate_response_with_context(query, relevant_context)
+        try:
+            conversation_history = self.load_conversation_history()
+            messages = self.build_messages(query, relevant_context, conversation_history)
+
+            payload = {
+                "model": self.model,
+                "messages": messages,
+                "max_tokens": 1024,
+                "temperature": 0.7,
+                "top_p": 0.95,
+                "citations": False,
+                "include_citations": False,
+                "search_recency_filter": "month",
+                "disable_search": True
+            }
+
+            print(f"🤖 Sending async request to Perplexity with {len(messages)} messages")
+
+            response = await client.post(self.base_url, json=payload,
+                                         headers={"Authorization": f"Bearer {self.api_key}"})
+
+            if response.status_code == 200:
+                result = response.json()
+                response_text = result["choices"][0]['message']['content']
+
+                # Remove citation markers like [1] and collapse leftover spaces
+                return _WS_RE.sub(' ', _CITATION_RE.sub('', response_text)).strip()
+            else:
+                print(f"Perplexity API error: {response.status_code} - {response.text}")
+                return f"Sorry, I encountered an error. Please try again. (Error: {response.status_code})"
+
+        except Exception as e:
+            print(f"Error generating response with Perplexity: {e}")
+            return f"Sorry, I encountered an error: {str(e)}"
+
+    def stream_response_with_context(self, query, relevant_context):
+        """Stream the response from Perplexity, yielding text chunks as they arrive
+
+        Passes stream=True and parses the SSE 'data: {...}' frames, so the
+        first token shows up after roughly one chunk latency instead of the
+        full generation time.
+        """
+        try:
+            conversation_history = self.load_conversation_history()
+            messages = self.build_messages(query, relevant_context, conversation_history)
+
+            payload = {
+                "model": self.model,
+                "messages": messages,
+                "max_tokens": 1024,
+                "temperature": 0.7,
+                "top_p": 0.95,
+                "citations": False,
+                "include_citations": False,
+                "search_recency_filter": "month",
+                "disable_search": True,
+                "stream": True
+            }
+
+            print(f"🤖 Streaming request to Perplexity with {len(messages)} messages")
+
+            response = self.session.post(self.base_url, json=payload, stream=True, timeout=30)
+
+            if response.status_code != 200:
+                print(f"Perplexity API error: {response.status_code} - {response.text}")
+                yield f"Sorry, I encountered an error. Please try again. (Error: {response.status_code})"
+                return
+
+            # A logical JSON event can arrive split across several frames.
+            # Fragments are collected in a list and joined only when the
+            # payload looks complete (ends in '}' or ']'), so total parse
+            # cost stays O(n) instead of re-parsing a growing buffer.
+            fragments = []
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                line = line.decode('utf-8')
+                if not line.startswith('data: '):
+                    continue
+                payload_text = line[len('data: '):]
+                if payload_text == '[DONE]':
+                    break
+                fragments.append(payload_text)
+                if payload_text.rstrip()[-1:] not in ('}', ']'):
+                    continue
+                try:
+                    event = json.loads(''.join(fragments))
+                except ValueError:
+                    continue  # Still incomplete; keep accumulating
+                fragments.clear()
+                try:
+                    delta = event["choices"][0]["delta"].get("content")
+                except (KeyError, IndexError):
+                    continue
+                if delta:
+                    # Strip citation markers like [1] from each chunk
+                    yield _CITATION_RE.sub('', delta)
+
+        except Exception as e:
+            print(f"Error streaming response with Perplexity: {e}")
+            yield f"Sorry, I encountered an error: {str(e)}"
@@ -1,133 +1,271 @@
+import heapq
+import logging
+import math
 import numpy as np
 import json
 import os
+import re
+from functools import lru_cache
+
+try:
+    import simsimd
+except ImportError:
+    simsimd = None  # Fall back to the NumPy matvec if simsimd isn't installed
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None  # Fall back to compiled regexes if pyahocorasick isn't installed
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None  # Scalar cosine stays on the NumPy path if numba isn't installed
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _cosine_fused(a, b):
+        """Fused single-pass cosine: dot and both squared norms in one loop"""
+        dot = 0.0
+        norm_a = 0.0
+        norm_b = 0.0
+        for i in range(a.shape[0]):
+            dot += a[i] * b[i]
+            norm_a += a[i] * a[i]
+            norm_b += b[i] * b[i]
+        if norm_a == 0.0 or norm_b == 0.0:
+            return 0.0
+        return dot / math.sqrt(norm_a * norm_b)
+else:
+    _cosine_fused = None
+
+# Tokenizer for set-based word matching
+_WORD_RE = re.compile(r'\w+')
+
+# Field-specific semantic mappings, fixed at code-load time
+_SEMANTIC_MAPPINGS = {
+    'hobbies': ['interests', 'passions', 'likes', 'enjoy', 'fun', 'leisure', 'activities'],
+    'skills': ['expertise', 'capabilities', 'proficiencies', 'technologies', 'tools'],
+    'experience': ['work history', 'career', 'background', 'years', 'duration'],
+    'languages': ['speak', 'fluent', 'communication', 'tongue', 'dialect'],
+    'certifications': ['certified', 'accreditation', 'qualification', 'badge', 'credential'],
+    'projects': ['work', 'developed', 'built', 'created', 'implemented'],
+    'achievements': ['awards', 'recognition', 'accomplishments', 'successes', 'milestones'],
+    'company': ['employer', 'organization', 'firm', 'workplace', 'corporation'],
+    'role': ['position', 'job title', 'responsibility', 'function', 'designation'],
+    'location': ['place', 'city', 'country', 'area', 'region'],
+    'ctc': ['salary', 'compensation', 'package', 'pay', 'remuneration'],
+    'notice': ['period', 'joining', 'start date', 'availability', 'timeline']
+}
+
+# Inverted index built once at import: trigger word -> synonym list, so the
+# per-field lookup is one dict hit per field word instead of a linear scan
+# over the whole mapping table
+_WORD_TO_SYNONYMS = {}
+for _key, _synonyms in _SEMANTIC_MAPPINGS.items():
+    for _word in _key.split() + [_key]:
+        _WORD_TO_SYNONYMS.setdefault(_word, []).extend(_synonyms)
+
+# Search diagnostics are debug-level: stdout writes on every scored chunk
+# are measurable in serverless deployments, and logger calls short-circuit
+# cheaply when the level is disabled
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=256)
+def _compile_keyword_pattern(keywords):
+    """Compile one alternation regex that matches any of the given keywords
+
+    Scoring then becomes a single C-level scan per text instead of one
+    Python substring search per keyword. Longer keywords come first so the
+    alternation prefers the most specific match. No word boundaries, to
+    keep the original substring-containment semantics ('java' matches
+    'javascript'). Memoized because the same keyword sets recur per call.
+    """
+    ordered = sorted(keywords, key=len, reverse=True)
+    return re.compile('|'.join(re.escape(keyword) for keyword in ordered))
+
+@lru_cache(maxsize=4)
+def _build_keyword_automaton(frozen_mappings):
+    """Build one Aho-Corasick automaton over every category's keywords
+
+    A single automaton pass over a text reports all keyword hits with
+    their owning categories, replacing one scan per category per text.
+    Keywords shared by several categories carry the full category tuple.
+    Memoized so the automaton is rebuilt only when the mappings change.
+    """
+    word_categories = {}
+    for category, keywords in frozen_mappings:
+        for keyword in keywords:
+            word_categories.setdefault(keyword, []).append(category)
+    automaton = ahocorasick.Automaton()
+    for keyword, categories in word_categories.items():
+        automaton.add_word(keyword, tuple(categories))
+    automaton.make_automaton()
+    return automaton
 
 class SearchUtils:
     @staticmethod
     def cosine_similarity(vec1, vec2):
-        """Calculate cosine similarity between two vectors"""
-        try:
-            vec1 = np.array(vec1)
-            vec2 = np.array(vec2)
-            dot_product = np.dot(vec1, vec2)
-            norm1 = np.linalg.norm(vec1)
-            norm2 = np.linalg.norm(vec2)
-            return dot_product / (norm1 * norm2)
-        except Exception as e:
-            print(f"Error calculating cosine similarity: {e}")
+        """Calculate cosine similarity between two vectors
+
+        Zero-norm vectors are handled with an explicit check rather than a
+        try/except around the division: the guard is two comparisons, while
+        the exception path costs frame setup on every pairwise call.
+        """
+        vec1 = np.asarray(vec1, dtype=np.float32)
+        vec2 = np.asarray(vec2, dtype=np.float32)
+        if _cosine_fused is not None:
+            # One fused pass over both vectors instead of three NumPy calls,
+            # each with its own dispatch and data pass
+            return float(_cosine_fused(vec1, vec2))
+        # vdot gives the squared norms directly, so one sqrt over their
+        # product replaces two linalg.norm calls (each with its own sqrt,
+        # axis handling and intermediate allocation)
+        norm_sq = np.vdot(vec1, vec1) * np.vdot(vec2, vec2)
+        if norm_sq == 0.0:
             return 0.0
+        return float(np.dot(vec1, vec2) / np.sqrt(norm_sq))
     
     @staticmethod
-    def find_relevant_context(query, embeddings_cache, get_cached_embedding_func, top_k=5):
-        """Find most relevant context using embeddings"""
+    def find_relevant_context(query, matrix, contents, get_cached_embedding_func, top_k=5,
+                              matrix_i8=None):
+        """Find most relevant context using embeddings
+
+        The rows of matrix are L2-normalized, so a single matrix-vector
+        product against the normalized query gives every cosine similarity
+        in one BLAS call instead of one Python-level cosine per entry.
+        """
         try:
             query_embedding = get_cached_embedding_func(query)
             if query_embedding is None:
                 print("⚠️ Falling back to simple keyword search")
                 return None  # Signal to use fallback search
-            
-            similarities = []
-            for text, data in embeddings_cache.items():
-                similarity = SearchUtils.cosine_similarity(query_embedding, data['embedding'])
-                similarities.append((similarity, data['content']))
-            
-            # Sort by similarity and get top k
-            similarities.sort(key=lambda x: x[0], reverse=True)
-            return [content for _, content in similarities[:top_k]]
-            
+
+            if matrix is None or len(contents) == 0:
+                return None
+
+            query_vec = np.asarray(query_embedding, dtype=np.float32)
+            norm = np.linalg.norm(query_vec)
+            if norm == 0:
+                # A zero query vector has no direction to rank against —
+                # bail out to the keyword fallback instead of scoring noise
+                return None
+            query_vec = query_vec / norm
+
+            if simsimd is not None and matrix_i8 is not None:
+                # Int8 byte-dot path: a quarter of the bytes moved, and the
+                # kernel uses VNNI-style fused byte dots where available
+                query_i8 = np.clip(np.round(query_vec * 127.0), -127, 127).astype(np.int8)
+                similarities = 1.0 - np.asarray(
+                    simsimd.cdist(query_i8[None, :], matrix_i8, metric='cosine'),
+                    dtype=np.float32).ravel()
+            elif simsimd is not None:
+                # One SIMD kernel call (AVX2/AVX-512/NEON) across all rows;
+                # cdist returns cosine distance, so flip it to similarity
+                query_vec = query_vec.astype(matrix.dtype, copy=False)
+                similarities = 1.0 - np.asarray(
+                    simsimd.cdist(query_vec[None, :], matrix, metric='cosine'),
+                    dtype=np.float32).ravel()
+            else:
+                # Match the matrix dtype (float16 in memory) so the product
+                # runs at the reduced width, then upcast for ranking
+                similarities = (matrix @ query_vec.astype(matrix.dtype, copy=False)).astype(np.float32)
+
+            # Partition out the top k in O(N), then sort only the survivors
+            # instead of paying an O(N log N) full sort for a handful of hits
+            if top_k < len(similarities):
+                candidates = np.argpartition(-similarities, top_k)[:top_k]
+            else:
+                candidates = np.arange(len(similarities))
+            order = candidates[np.argsort(-similarities[candidates])]
+            return [contents[i] for i in order]
+
         except Exception as e:
             print(f"Error in find_relevant_context: {e}")
             return None  # Signal to use fallback search
     
     @staticmethod
     def _extract_all_fields_from_profile(profile_data):
-        """Extract all available fields from profile data dynamically"""
+        """Extract all available fields from profile data dynamically
+
+        Walks the profile with an explicit stack instead of a recursive
+        closure — no per-level Python frames or cell-variable dereferences,
+        and no recursion limit on deeply nested profiles.
+        """
         all_fields = {}
-        
-        def extract_fields_recursive(data, prefix=""):
-            if isinstance(data, dict):
-                for key, value in data.items():
-                    current_key = f"{prefix}.{key}" if prefix else key
-                    if isinstance(value, (str, int, float, bool)):
-                        # Simple field
-                        all_fields[current_key] = {
-                            'type': 'simple',
-                            'value': str(value),
-                            'keywords': [key, str(value).lower()]
-                        }
-                    elif isinstance(value, list):
-                        # Array field
-                        all_fields[current_key] = {
-                            'type': 'array',
-                            'value': value,
-                            'keywords': [key] + [str(item).lower() for item in value if item]
-                        }
-                    elif isinstance(value, dict):
-                        # Nested object
-                        all_fields[current_key] = {
-                            'type': 'nested',
-                            'value': value,
-                            'keywords': [key]
-                        }
-                        extract_fields_recursive(value, current_key)
-        
-        extract_fields_recursive(profile_data)
+        stack = [(profile_data, "")]
+
+        while stack:
+            data, prefix = stack.pop()
+            if not isinstance(data, dict):
+                continue
+            for key, value in data.items():
+                current_key = prefix + '.' + key if prefix else key
+                if isinstance(value, (str, int, float, bool)):
+                    # Simple field
+                    all_fields[current_key] = {
+                        'type': 'simple',
+                        'value': str(value),
+                        'keywords': [key, str(value).lower()]
+                    }
+                elif isinstance(value, list):
+                    # Array field
+                    all_fields[current_key] = {
+                        'type': 'array',
+                        'value': value,
+                        'keywords': [key] + [str(item).lower() for item in value if item]
+                    }
+                elif isinstance(value, dict):
+                    # Nested object
+                    all_fields[current_key] = {
+                        'type': 'nested',
+                        'value': value,
+                        'keywords': [key]
+                    }
+                    stack.append((value, current_key))
+
         return all_fields
     
     @staticmethod
     def _generate_semantic_keywords_for_field(field_name, field_value, field_type):
-        """Generate semantic keywords for a field using AI or rule-based approach"""
-        semantic_keywords = []
-        
+        """Generate semantic keywords for a field using AI or rule-based approach
+
+        Accumulates straight into a set so each keyword is hashed once,
+        instead of building a list and deduplicating at the end.
+        """
+        semantic_keywords = set()
+
         # Base keywords from field name
-        field_words = field_name.replace('_', ' ').lower().split()
-        semantic_keywords.extend(field_words)
-        
+        semantic_keywords.update(field_name.replace('_', ' ').lower().split())
+
         # Add common synonyms based on field type and content
         if field_type == 'array':
-            semantic_keywords.extend(['list', 'items', 'collection'])
+            semantic_keywords.update(['list', 'items', 'collection'])
         elif field_type == 'nested':
-            semantic_keywords.extend(['details', 'information', 'data'])
-        
+            semantic_keywords.update(['details', 'information', 'data'])
+
         # Add common question words
-        question_words = ['what', 'tell me about', 'describe', 'explain', 'show']
-        semantic_keywords.extend(question_words)
-        
-        # Add field-specific semantic mappings
-        semantic_mappings = {
-            'hobbies': ['interests', 'passions', 'likes', 'enjoy', 'fun', 'leisure', 'activities'],
-            'skills': ['expertise', 'capabilities', 'proficiencies', 'technologies', 'tools'],
-            'experience': ['work history', 'career', 'background', 'years', 'duration'],
-            'languages': ['speak', 'fluent', 'communication', 'tongue', 'dialect'],
-            'certifications': ['certified', 'accreditation', 'qualification', 'badge', 'credential'],
-            'projects': ['work', 'developed', 'built', 'created', 'implemented'],
-            'achievements': ['awards', 'recognition', 'accomplishments', 'successes', 'milestones'],
-            'company': ['employer', 'organization', 'firm', 'workplace', 'corporation'],
-            'role': ['position', 'job title', 'responsibility', 'function', 'designation'],
-            'location': ['place', 'city', 'country', 'area', 'region'],
-            'ctc': ['salary', 'compensation', 'package', 'pay', 'remuneration'],
-            'notice': ['period', 'joining', 'start date', 'availability', 'timeline']
-        }
-        
-        # Find matching semantic mappings
-        for key, synonyms in semantic_mappings.items():
-            if key in field_name.lower() or any(word in field_name.lower() for word in key.split()):
-                semantic_keywords.extend(synonyms)
+        semantic_keywords.update(['what', 'tell me about', 'describe', 'explain', 'show'])
+
+        # Find matching semantic mappings with one reverse-index hit per
+        # field word instead of scanning the whole mapping table
+        for word in _WORD_RE.findall(field_name.lower()):
+            synonyms = _WORD_TO_SYNONYMS.get(word)
+            if synonyms:
+                semantic_keywords.update(synonyms)
                 break
-        
+
         # Add content-based keywords
         if isinstance(field_value, list):
             for item in field_value:
                 if isinstance(item, str):
-                    item_words = item.lower().split()
-                    semantic_keywords.extend(item_words)
-        
+                    semantic_keywords.update(item.lower().split())
+
         # TODO: Future Enhancement - Use AI (Gemma) to generate better synonyms
         # This would make the system even more intelligent
-        # semantic_keywords.extend(SearchUtils._generate_ai_synonyms(field_name, field_value))
-        
-        # Remove duplicates and return
-        return list(set(semantic_keywords))
+        # semantic_keywords.update(SearchUtils._generate_ai_synonyms(field_name, field_value))
+
+        return semantic_keywords
     
     @staticmethod
     def _generate_ai_synonyms(field_name, field_value):
@@ -139,7 +277,7 @@ class SearchUtils:
     @staticmethod
     def _build_dynamic_mappings(profile_data):
         """Build keyword mappings dynamically from profile data using AI-generated semantics"""
-        print("🔍 Building dynamic semantic mappings from profile data...")
+        logger.debug("🔍 Building dynamic semantic mappings from profile data...")
         
         # Extract all fields from profile
         all_fields = SearchUtils._extract_all_fields_from_profile(profile_data)
@@ -158,68 +296,117 @@ class SearchUtils:
             
             # Create category name from field
             category_name = field_name.replace('_', ' ').lower()
-            
-            # Add to semantic mappings
+
+            # Merge into the category set; already deduplicated, so no
+            # second list(set(...)) pass at the end
             if category_name not in semantic_mappings:
-                semantic_mappings[category_name] = []
-            
-            semantic_mappings[category_name].extend(semantic_keywords)
-        
-        # Remove duplicates from each category
+                semantic_mappings[category_name] = set()
+
+            semantic_mappings[category_name].update(semantic_keywords)
+
+        # Freeze each category to a list for downstream consumers
         for category in semantic_mappings:
-            semantic_mappings[category] = list(set(semantic_mappings[category]))
+            semantic_mappings[category] = list(semantic_mappings[category])
         
-        print(f"🎯 Generated {len(semantic_mappings)} semantic categories with AI-enhanced keywords")
+        logger.debug("🎯 Generated %d semantic categories with AI-enhanced keywords", len(semantic_mappings))
         
         return semantic_mappings
     
     @staticmethod
-    def find_relevant_context_simple(query, profile_data, top_k=5):
-        """Simple keyword-based fallback search for profile data"""
+    def tokenize_chunks(chunks_lower):
+        """Precompute per-chunk token sets from already-lowercased chunks"""
+        return [frozenset(_WORD_RE.findall(chunk_lower)) for chunk_lower in chunks_lower]
+
+    @staticmethod
+    def find_relevant_context_simple(query, profile_data, top_k=5, profile_data_lower=None,
+                                     dynamic_mappings=None, profile_data_tokens=None):
+        """Simple keyword-based fallback search for profile data
+
+        Callers that hold the chunks long-term can pass parallel lists of
+        pre-lowercased chunks and pre-tokenized chunk sets plus the
+        precomputed semantic mappings, so none of the case-folding,
+        tokenizing or profile-walking work is repeated per request.
+        """
         query_lower = query.lower()
+        if profile_data_lower is None:
+            profile_data_lower = [chunk.lower() for chunk in profile_data]
         relevant = []
+
+        logger.debug("🔍 Simple search for: '%s'", query)
+        logger.debug("📊 Profile data has %d chunks", len(profile_data))
+
+        # Dynamic keyword mappings based on profile content; a pure function
+        # of the profile, so long-lived callers precompute them once
+        if dynamic_mappings is None:
+            dynamic_mappings = SearchUtils._build_dynamic_mappings(profile_data)
         
-        print(f"🔍 Simple search for: '{query}'")
-        print(f"📊 Profile data has {len(profile_data)} chunks")
-        
-        # Dynamic keyword mappings based on profile content
-        dynamic_mappings = SearchUtils._build_dynamic_mappings(profile_data)
-        
-        # Find the best matching category
+        # One automaton pass scores every category at once; without
+        # pyahocorasick, fall back to one compiled-regex scan per category
+        automaton = None
+        if ahocorasick is not None and dynamic_mappings:
+            frozen = tuple(sorted(
+                (category, tuple(sorted(keywords)))
+                for category, keywords in dynamic_mappings.items()))
+            automaton = _build_keyword_automaton(frozen)
+
         best_category = None
         best_score = 0
+
+        if automaton is not None:
+            category_scores = {}
+            for _end, categories in automaton.iter(query_lower):
+                for category in categories:
+                    category_scores[category] = category_scores.get(category, 0) + 1
+            if category_scores:
+                best_category, best_score = max(category_scores.items(), key=lambda kv: kv[1])
+        else:
+            for category, keywords in dynamic_mappings.items():
+                pattern = _compile_keyword_pattern(tuple(sorted(keywords)))
+                score = len(pattern.findall(query_lower))
+                if score > best_score:
+                    best_score = score
+                    best_category = category
         
-        for category, keywords in dynamic_mappings.items():
-            score = sum(1 for keyword in keywords if keyword in query_lower)
-            if score > best_score:
-                best_score = score
-                best_category = category
-        
-        print(f"🎯 Best category: {best_category} (score: {best_score})")
-        
+        logger.debug("🎯 Best category: %s (score: %d)", best_category, best_score)
+
+        # Guard the per-chunk match lines so the slicing/formatting is
+        # skipped entirely when debug logging is off
+        log_matches = logger.isEnabledFor(logging.DEBUG)
+
         # If no specific category found, use general word matching
         if best_score == 0:
-            print("🔄 Using general word matching...")
-            for chunk in profile_data:
-                chunk_lower = chunk.lower()
-                query_words = query_lower.split()
-                score = sum(1 for word in query_words if word in chunk_lower)
+            logger.debug("🔄 Using general word matching...")
+            # Hashed set intersection: O(|query| + |chunk|) per chunk versus
+            # one substring scan per query word
+            query_tokens = frozenset(_WORD_RE.findall(query_lower))
+            if profile_data_tokens is None:
+                profile_data_tokens = SearchUtils.tokenize_chunks(profile_data_lower)
+            for chunk, chunk_tokens in zip(profile_data, profile_data_tokens):
+                score = len(query_tokens & chunk_tokens)
                 if score > 0:
                     relevant.append((score, chunk))
-                    print(f"   ✅ Found match (score: {score}): {chunk[:50]}...")
+                    if log_matches:
+                        logger.debug("   ✅ Found match (score: %d): %s...", score, chunk[:50])
         else:
             # Use category-specific matching
-            print(f"🎯 Using category-specific matching for '{best_category}'...")
-            for chunk in profile_data:
-                chunk_lower = chunk.lower()
-                category_keywords = dynamic_mappings.get(best_category, [])
-                score = sum(1 for keyword in category_keywords if keyword in chunk_lower)
+            logger.debug("🎯 Using category-specific matching for '%s'...", best_category)
+            category_pattern = None
+            if automaton is None:
+                category_pattern = _compile_keyword_pattern(
+                    tuple(sorted(dynamic_mappings.get(best_category, []))))
+            for chunk, chunk_lower in zip(profile_data, profile_data_lower):
+                if automaton is not None:
+                    score = sum(1 for _end, categories in automaton.iter(chunk_lower)
+                                if best_category in categories)
+                else:
+                    score = len(category_pattern.findall(chunk_lower))
                 if score > 0:
                     relevant.append((score, chunk))
-                    print(f"   ✅ Found match (score: {score}): {chunk[:50]}...")
-        
-        print(f"📚 Total relevant chunks found: {len(relevant)}")
+                    if log_matches:
+                        logger.debug("   ✅ Found match (score: %d): %s...", score, chunk[:50])
+
+        logger.debug("📚 Total relevant chunks found: %d", len(relevant))
         
-        # Sort by score and get top k
-        relevant.sort(key=lambda x: x[0], reverse=True)
-        return [chunk for _, chunk in relevant[:top_k]]
+        # Keep a size-k min-heap instead of sorting every candidate
+        top = heapq.nlargest(top_k, relevant, key=lambda x: x[0])
+        return [chunk for _, chunk in top]
@@ -21,8 +21,11 @@ def clear_cache():
     """Clear all cached files to ensure fresh data"""
     print("🧹 Clearing cache files...")
     
-    # Clear profile embeddings cache
-    cache_files = glob.glob('cache/*.pkl')
+    # Clear profile embeddings cache (.npy matrix + .idx index, plus any
+    # legacy .f32/.pkl files from older formats)
+    cache_files = []
+    for pattern in ('cache/*.pkl', 'cache/*.npy', 'cache/*.idx', 'cache/*.f32'):
+        cache_files.extend(glob.glob(pattern))
     for cache_file in cache_files:
         try:
             os.remove(cache_file)